@@ -10,50 +10,183 @@ The plot displays the Gini coefficient as well as the 'balanced inequality ratio
 (Kunegis and Preusse, doi:10.1145/2380718.238074).
 Call: plot_lorenz_GP(xlor, ylor, x_measure = '', y_measure='income',
                    figw=6, show_caption=True, save_as='')
+The numbers alone: compute_lgp(xlor, ylor) -> LGPResult(gini, Px, Py, N).
 """
 
 import os
+import re
+import sys
+import datetime
+import functools
+from typing import NamedTuple
 import numpy as np
-from scipy.integrate import trapz
 
 import matplotlib.pyplot as plt
-from matplotlib import lines
 from matplotlib.ticker import PercentFormatter
 
+try:
+    from IPython.display import Markdown
+except ImportError:
+    # IPython is only needed by the notebook utils (check_notebook, caveat_codor).
+    Markdown = None
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    # numba is optional: _find_P then runs as plain Python (a bisection),
+    # and _gini falls back to its vectorized NumPy form.
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DIR_IMG = os.path.join(os.path.dirname(BASE_DIR), 'images')
+
+# Maximum number of points used to draw the Lorenz curve and the shaded
+# Gini area; the computations always use the full arrays:
+MAX_LINE_PTS = 5000
+MAX_AREA_PTS = 2000
+
+# Transparency of the diagonals, grid and shaded Gini area:
+DIAG_ALPHA = 0.5
+GRID_ALPHA = 0.2
+AREA_ALPHA = 0.3
+
+# Bold markers in format strings, e.g. '_b{}b_' or '_b{}; {}b_':
+BOLD_RE = re.compile(r'_b(\{.*?\})b_', re.DOTALL)
     
-def findIntersection(sx, arr1, arr2, ax=None, c='red'):
+@njit(cache=True, nogil=True)
+def _find_P(xlor, ylor):
     """
-    Graphical approach to finding intersecting points (candidates)
-    using arrays of points from two objects (e.g. a line, a curve).
-    If no single match found, increase init_tol by step until at most
-    two values are found within max_iter repetitions.
-    P is plotted if found.
+    Returns the intersection (Px, Py) of the Lorenz curve with the
+    antidiagonal, y = 1 - x.
+    Since xlor + ylor is monotone for a Lorenz curve, the crossing segment
+    (where xlor + ylor = 1) is found by bisection, then P is obtained in
+    closed form on that segment.
     """
-    if ax is None:
-        ax = plt.gca()
+    n = xlor.size
+    # Written so that NaN end points also fail the check:
+    if n < 2 or not (xlor[0] + ylor[0] <= 1.0 <= xlor[n-1] + ylor[n-1]):
+        raise ValueError("The Lorenz curve does not cross the antidiagonal.")
     
-    # noise:
-    noise_prec = 4
-    eps1 = np.exp(np.random.randn(len(arr1))) * 10**-noise_prec
-    eps2 = np.exp(np.random.randn(len(arr1))) * 10**-noise_prec
+    # First index k with xlor[k] + ylor[k] >= 1 (cf. np.searchsorted):
+    lo = 0
+    hi = n - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if xlor[mid] + ylor[mid] < 1.0:
+            lo = mid + 1
+        else:
+            hi = mid
+    k = max(lo, 1)
     
-    y_anti = 1 - sx
-    interps = np.interp(sx, arr1+eps1, arr2+eps2)
-    py = np.argmin((interps - y_anti)**2)
+    # Parametric position of P on segment (k-1, k):
+    g0 = xlor[k-1] + ylor[k-1] - 1.0
+    g1 = xlor[k] + ylor[k] - 1.0
+    t = -g0 / (g1 - g0) if g1 > g0 else 1.0
+    Py = ylor[k-1] + t * (ylor[k] - ylor[k-1])
+    return 1.0 - Py, Py
+
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _gini(xlor, ylor):
+        """
+        Returns the Gini coefficient, G = 2A = 1 - 2*integral(ylor),
+        using the trapezoidal rule in a single pass.
+        """
+        s = 0.0
+        for i in range(1, xlor.size):
+            s += (xlor[i] - xlor[i-1]) * (ylor[i] + ylor[i-1])
+        return 1.0 - s
+else:
+    def _gini(xlor, ylor):
+        """
+        Returns the Gini coefficient, G = 2A = 1 - 2*integral(ylor),
+        using the trapezoidal rule as a single dot product.
+        """
+        return 1.0 - np.dot(np.diff(xlor), ylor[1:] + ylor[:-1])
+
+
+def _thin(arr, max_pts):
+    """
+    Returns arr strided down to about max_pts points, keeping its
+    last point; for display only.
+    """
+    stride = max(1, arr.size // max_pts)
+    if stride == 1:
+        return arr
+    return np.append(arr[:-1:stride], arr[-1])
+
+
+class LGPResult(NamedTuple):
+    """
+    Numeric outputs of an 'augmented' Lorenz curve (see compute_lgp).
+    """
+    gini: float
+    Px: float
+    Py: float
+    N: int
 
-    Py = interps[py]
-    Px = 1 - Py
+
+def compute_lgp(xlor, ylor):
+    """
+    Returns the Gini coefficient and the 'balanced inequality ratio' P of
+    a Lorenz curve as a LGPResult(gini, Px, Py, N), without plotting.
+    The result can be passed to plot_lorenz_GP (lgp=...) to re-plot the
+    same data without recomputing it.
+    xlor, ylor: the cumulative share of the population and measure, respectively (1D).
+    """
+    # check0: no copy if already arrays:
+    xlor = np.asarray(xlor)
+    ylor = np.asarray(ylor)
+        
+    # check1:
+    N = xlor.size
+    if N != ylor.size:
+        msg = "The input series must have the same length;"
+        msg += f"\nGiven: xlor: {N}, ylor: {ylor.size}."
+        raise ValueError(msg)
+     
+    # check2:
+    close_to1 = np.allclose(xlor[-1], 1.0) or np.allclose(ylor[-1], 1.0) 
+    if not close_to1:
+        msg = "The input series must be the cumulative share of a quantity,"
+        msg += " e.g. xlor = x.cumsum()/x.sum()."
+        raise TypeError(msg)
+    
+    Px, Py = _find_P(xlor, ylor)
+    return LGPResult(_gini(xlor, ylor), Px, Py, N)
+
+
+def plot_P(Px, Py, ax=None, c='red'):
+    """
+    Plots and labels the point P on ax.
+    """
+    if ax is None:
+        ax = plt.gca()
     
     ax.plot(Px, Py, marker='o', color=c, ms=4)    
-    p_str = 'P ({:.1%},{:.1%})'.format(Px, Py)
+    p_str = f'P ({Px:.1%},{Py:.1%})'
     
     xoffset = -0.25 if Px > 0.9 else 0
     
     ax.text(Px+xoffset, Py+0.05,p_str,
              ha='center', fontsize=12)
+
+
+def findIntersection(arr1, arr2, ax=None, c='red'):
+    """
+    Finds the intersection P of the Lorenz curve (arr1, arr2) with the
+    antidiagonal, y = 1 - x (see _find_P).
+    P is plotted on ax.
+    """
+    Px, Py = _find_P(arr1, arr2)
+    plot_P(Px, Py, ax=ax, c=c)
     return Px, Py
     
 
@@ -61,7 +194,8 @@ def plot_lorenz_GP(xlor, ylor,
                    x_measure = '', y_measure='income',
                    figw=5,
                    show_caption=True,
-                   save_as='', format='png'):
+                   save_as='', format='png',
+                   show_area=True, lgp=None):
     """
     Wrapper to obtain an 'augmented' Lorenz plot for a distribution;
     The plot displays the Gini coefficient as well as the 'balanced inequality ratio, P'
@@ -76,31 +210,20 @@ def plot_lorenz_GP(xlor, ylor,
     show_caption: add a figure caption with a Pareto-rule-like statement using P, such as:
     "P% of the <x_measure> population account for (1-P)% of the <y_measure>."
     save_as: if not '', figure is save.
+    show_area: shade the area between the equality line and the curve (= G/2).
+    lgp: the LGPResult of compute_lgp(xlor, ylor), if already available.
     """
-    # check0:
-    try:
-        sx = xlor.sum()
-        sy = ylor.sum()
-    except AttributeError:
-        xlor = np.array(xlor)
-        ylor = np.array(ylor)
-    finally:
-        sx = xlor.sum()
-        sy = ylor.sum()
-        
-    # check1:
-    N = xlor.size
-    if N != ylor.size:
-        msg = "The input series must have the same length;"
-        msg += "\nGiven: xlor: {}, ylor: {}.".format(sx,sy)
+    xlor = np.asarray(xlor)
+    ylor = np.asarray(ylor)
+    
+    if lgp is None:
+        lgp = compute_lgp(xlor, ylor)
+    elif not lgp.N == xlor.size == ylor.size:
+        msg = "The input series and lgp must have the same length;"
+        msg += f"\nGiven: xlor: {xlor.size}, ylor: {ylor.size}, lgp.N: {lgp.N}."
         raise ValueError(msg)
-     
-    # check2:
-    close_to1 = np.allclose(xlor[-1], 1.0) or np.allclose(ylor[-1], 1.0) 
-    if not close_to1:
-        msg = "The input series must be the cumulative share of a quantity,"
-        msg += " e.g. xlor = x.cumsum()/x.sum()."
-        raise TypeError(msg)
+    N = lgp.N
+    Px, Py = lgp.Px, lgp.Py
         
     if not y_measure: y_measure = 'income'
     
@@ -108,45 +231,37 @@ def plot_lorenz_GP(xlor, ylor,
     fig = plt.figure(figsize=(figw + 1, figw))
     ax = fig.add_subplot(111)
     
-    alfa = 0.5
-    
-    # lorenz curve plot:
-    ax.plot(xlor, ylor, label='Lorenz')
+    # lorenz curve plot, thinned for display when N > MAX_LINE_PTS:
+    ax.plot(_thin(xlor, MAX_LINE_PTS), _thin(ylor, MAX_LINE_PTS),
+            label='Lorenz', rasterized=N > MAX_LINE_PTS)
     
-    ax.grid(True, alpha=alfa - 0.3)
+    ax.grid(True, alpha=GRID_ALPHA)
 
-    # fill the area between diag, the equality line, and the curve:
-    plt.fill_between(xlor, xlor, ylor, 
-                     color='pink', alpha=alfa - 0.2)
+    if show_area:
+        # fill the area between diag, the equality line, and the curve:
+        xa = _thin(xlor, MAX_AREA_PTS)
+        ax.fill_between(xa, xa, _thin(ylor, MAX_AREA_PTS),
+                        color='pink', alpha=AREA_ALPHA,
+                        rasterized=N > MAX_AREA_PTS)
 
-    # Get the gini coef from the fill area, G = 2A.
-    twiceA = 1 - 2*np.trapz(ylor, x=xlor)
-    ax.text(0.4, 0.15, 'Gini: {:.1%}'.format(twiceA),
+    # Get the gini coef from the fill area, G = 2A:
+    ax.text(0.4, 0.15, f'Gini: {lgp.gini:.1%}',
             ha='center', fontsize=14)
 
     # Plot the diagonals:
-    # range for diagonals with at least 100 pts:
-    Ndx = np.max([100, N])
-
-    dx = np.linspace(0.0, 1.0, Ndx)
-    y_anti = 1 - dx 
-    
-    diag = lines.Line2D(dx, dx, c='green', linestyle='dotted', alpha=alfa)
-    anti = lines.Line2D(dx, y_anti, c='grey', linestyle='dotted', alpha=alfa)
-    ax.add_line(diag)
-    ax.add_line(anti)
+    ax.axline((0, 0), (1, 1), c='green', linestyle='dotted', alpha=DIAG_ALPHA)
+    ax.axline((0, 1), (1, 0), c='grey', linestyle='dotted', alpha=DIAG_ALPHA)
     
-    # Get the 'balanced inequality ratio', the intersection P of the Lorenz
+    # Plot the 'balanced inequality ratio', the intersection P of the Lorenz
     # curve with the antidiagonal;
-    Px, Py = findIntersection(dx, xlor, ylor, ax=ax)
+    plot_P(Px, Py, ax=ax)
     
-    what = x_measure.center(2+len(x_measure))
-    x_pop = 'the{}population '.format(what)
+    what = f' {x_measure} ' if x_measure else ' '
+    x_pop = f'the{what}population '
     
     if show_caption:
         # Create a "narrative" to use as caption:
-        s = '{:.1%} of {}\n'.format(Py, x_pop)
-        s += 'accounts for\n{:.1%} of the {}.'.format(Px, y_measure)
+        s = f'{Py:.1%} of {x_pop}\naccounts for\n{Px:.1%} of the {y_measure}.'
         ax.text(0.47, 0.96, s, 
                 ha='center',va='center',
                 style='italic', fontsize=11, wrap=True)
@@ -154,9 +269,9 @@ def plot_lorenz_GP(xlor, ylor,
     ax.xaxis.set_major_formatter(PercentFormatter(1))
     ax.yaxis.set_major_formatter(PercentFormatter(1))
 
-    ax.set_title('Lorenz-Gini-P curve ({})'.format(N))
-    ax.set_xlabel('Cummuative share of {}'.format(x_pop))
-    ax.set_ylabel('Cummuative share of {}'.format(y_measure))
+    ax.set_title(f'Lorenz-Gini-P curve ({N})')
+    ax.set_xlabel(f'Cummuative share of {x_pop}')
+    ax.set_ylabel(f'Cummuative share of {y_measure}')
     
     if save_as:
         pic = os.path.basename(save_as).split('.')[0] + '.' + format
@@ -164,26 +279,26 @@ def plot_lorenz_GP(xlor, ylor,
         plt.savefig(fname, transparent=True)
 
 
+@functools.lru_cache(maxsize=1)
 def is_lab_notebook():
-        import re
-        import psutil
-        
-        return any(re.search('jupyter-lab-script', x)
-                   for x in psutil.Process().parent().cmdline())
+    """
+    Returns True when running in a Jupyter kernel (JupyterLab or
+    Notebook 7, which is built on JupyterLab); checks the environment
+    instead of the parent process command line.
+    """
+    return os.environ.get('JPY_PARENT_PID') is not None
                    
 def check_notebook():
     """
     Util to check a Jupyter notebook environment:
-    a markdown cell in a jupyter lab notebook cannot render
+    a markdown cell in a Jupyter notebook cannot render
     variables: the cell text needs to be created with
     IPython.display.Markdown.
     """
 
     if is_lab_notebook():
         # need to use Markdown if referencing variables:
-        from IPython.display import Markdown
-               
-        msg = "This is a <span style=\"color:red;\">JupyterLab notebook \
+        msg = "This is a <span style=\"color:red;\">Jupyter notebook \
               </span>: Use `IPython.display.Markdown()` if referencing variables; \
               {{var}} does not work."
         return Markdown('### {}'.format(msg))
@@ -217,42 +332,28 @@ def format_with_bold(s_format):
         err_msg1 = "Bold indicators not paired. Expected '_b{}b_'."
         raise LookupError(err_msg1)
     
-    # Check for start bold marker:
-    b1 = '_b'
-    i = s_format.find(b1 + '{')
-    
     # Check marker order: '_b' past 'b_'?:
-    if i > s_format.find('}' + 'b_'):
+    if s_format.find('_b{') > s_format.find('}b_'):
         err_msg2 = "Starting bold indicator not found. Expected '_b{}b_'."
         raise LookupError(err_msg2)
-        
-    while i != -1:
-        
-        # Check for trailing bold marker:
-        b2 = 'b_'
-        j = s_format.find('}' + b2)
-        
-        if j != -1:
-            s_format = s_format.replace(b1, '\033[1m')
-            s_format = s_format.replace(b2, '\033[0m')
-        else:
-            err_msg3 = "Trailing bold indicator not found. Expected '_b{}b_'."
-            raise LookupError(err_msg3)
-            
-        i = s_format.find(b1 + '{')
+    
+    s_format = BOLD_RE.sub('\033[1m\\1\033[0m', s_format)
+    
+    # Check for trailing bold marker:
+    if '_b{' in s_format:
+        err_msg3 = "Trailing bold indicator not found. Expected '_b{}b_'."
+        raise LookupError(err_msg3)
     
     return s_format
 
 
 def as_of():
-    import datetime
     return datetime.datetime.today().strftime("%b %Y")
 
 
 def caveat_codor():
-    import sys
-    from IPython.display import Markdown
-
+    if Markdown is None:
+        raise ImportError("caveat_codor requires IPython.")
     mysys = '{} | {}<br>As of:  {}'.format(sys.version,
                                            sys.platform,
                                            as_of())
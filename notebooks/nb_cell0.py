@@ -34,16 +34,12 @@ add_to_sys_path(os.path.curdir, up)
 
 
 def is_lab_notebook():
-    import re
-    import psutil
-        
-    return any(re.search('jupyter-lab-script', x)
-               for x in psutil.Process().parent().cmdline())
+    return os.environ.get('JPY_PARENT_PID') is not None
 
 if is_lab_notebook():
     # need to use Markdown if referencing variables:
     from IPython.display import Markdown, HTML
-    msg = "This is a JupyterLab notebook: Use `IPython.display.\
+    msg = "This is a Jupyter notebook: Use `IPython.display.\
            Markdown()` if referencing variables in a Markdown cell."
     return Markdown('### {}'.format(msg))
 